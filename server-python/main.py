@@ -1,5 +1,6 @@
 import os
-import json
+import logging
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
@@ -19,8 +20,26 @@ from models import (
     BeatChatRequest,
 )
 from services.llm_service import llm_service
+from services.streaming import dumps_json
+from services.observability.langfuse_client import langfuse_client
 
-app = FastAPI(title="Screenwriter AI Server", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the DB pool's min_size connections up front so the first chat
+    # request doesn't pay connection setup.
+    try:
+        await llm_service._ensure_db_pool()
+    except Exception as e:
+        logger.warning(f"Startup DB pool warmup failed: {e}")
+    yield
+    # Upload any Langfuse events still buffered by the SDK.
+    langfuse_client.flush()
+
+
+app = FastAPI(title="Screenwriter AI Server", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware - same origins as Node.js version
 app.add_middleware(
@@ -49,6 +68,7 @@ async def root():
             "POST /api/chat - Chat messages (streaming)",
             "POST /api/beat-chat - Beat AI chat (streaming JSON ops)",
             "POST /api/command - Execute rewrite command",
+            "POST /api/command/stream - Execute rewrite command (streaming)",
         ]
     }
 
@@ -74,7 +94,8 @@ async def health():
     return {
         "status": "ok",
         "configured": llm_service.is_configured(),
-        "database_connected": db_connected
+        "database_connected": db_connected,
+        "database_pool": llm_service.pool_stats(),
     }
 
 
@@ -93,10 +114,10 @@ async def stream_completion(context: CompletionContext):
     async def generate():
         try:
             async for chunk in llm_service.stream_completion(context):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+                yield f"data: {dumps_json({'content': chunk})}\n\n"
             yield "data: [DONE]\n\n"
         except Exception as stream_error:
-            yield f"data: {json.dumps({'error': str(stream_error)})}\n\n"
+            yield f"data: {dumps_json({'error': str(stream_error)})}\n\n"
 
     return StreamingResponse(
         generate(),
@@ -138,25 +159,27 @@ async def stream_chat(request: ChatRequest):
                 request.contextElementIds,
                 request.model,
             ):
+                # Typed agent events come pre-encoded as UTF-8 JSON lines, one batch per
+                # chunk; frame the whole batch in one pass so it goes out as one send.
+                if isinstance(chunk, bytes):
+                    yield b"data: " + chunk.replace(b"\n", b"\n\ndata: ") + b"\n\n"
+                    continue
+
                 if request.streamEvents is False:
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
+                    yield f"data: {dumps_json({'content': chunk})}\n\n"
                     continue
 
-                try:
-                    # Typed chat chunks are already app-level JSON events.
-                    parsed = json.loads(chunk)
-                    if isinstance(parsed, dict):
-                        yield f"data: {json.dumps(parsed)}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type': 'text_delta', 'content': str(chunk)})}\n\n"
-                except Exception:
-                    yield f"data: {json.dumps({'type': 'text_delta', 'content': chunk})}\n\n"
+                # Other typed chunks are already encoded JSON events; forward them as-is.
+                if chunk.startswith("{"):
+                    yield f"data: {chunk}\n\n"
+                else:
+                    yield f"data: {dumps_json({'type': 'text_delta', 'content': chunk})}\n\n"
             yield "data: [DONE]\n\n"
         except Exception as stream_error:
             if request.streamEvents is False:
-                yield f"data: {json.dumps({'error': str(stream_error)})}\n\n"
+                yield f"data: {dumps_json({'error': str(stream_error)})}\n\n"
             else:
-                yield f"data: {json.dumps({'type': 'error', 'error': str(stream_error)})}\n\n"
+                yield f"data: {dumps_json({'type': 'error', 'error': str(stream_error)})}\n\n"
 
     return StreamingResponse(
         generate(),
@@ -196,10 +219,10 @@ async def stream_beat_chat(request: BeatChatRequest):
                 request.projectId,
                 request.model,
             ):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+                yield f"data: {dumps_json({'content': chunk})}\n\n"
             yield "data: [DONE]\n\n"
         except Exception as stream_error:
-            yield f"data: {json.dumps({'error': str(stream_error)})}\n\n"
+            yield f"data: {dumps_json({'error': str(stream_error)})}\n\n"
 
     return StreamingResponse(
         generate(),
@@ -234,6 +257,36 @@ async def execute_command(request: CommandRequest):
         )
 
 
+@app.post("/api/command/stream")
+async def stream_command(request: CommandRequest):
+    """Command execution (streaming)"""
+    if not llm_service.is_configured():
+        return JSONResponse(
+            status_code=503,
+            content={
+                "error": "AI not configured",
+                "message": "Add OPENAI_API_KEY to server/.env file"
+            }
+        )
+
+    async def generate():
+        try:
+            async for chunk in llm_service.execute_command_stream(request):
+                yield f"data: {dumps_json({'content': chunk})}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as stream_error:
+            yield f"data: {dumps_json({'error': str(stream_error)})}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        }
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", "3002"))
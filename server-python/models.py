@@ -1,4 +1,4 @@
-from typing import Optional, List, Literal
+from typing import Dict, Optional, List, Literal
 from pydantic import BaseModel
 
 
@@ -49,6 +49,7 @@ class HealthResponse(BaseModel):
     status: str
     configured: bool
     database_connected: Optional[bool] = None
+    database_pool: Optional[Dict[str, int]] = None
 
 
 class CommandResponse(BaseModel):
@@ -0,0 +1,99 @@
+"""
+In-process cache for ask-mode answers.
+
+Retrieval in this service no longer uses embeddings, so near-duplicate prompts
+are matched on a normalized form of the prompt text (case, punctuation and
+whitespace folded) instead of by vector similarity.  Entries are namespaced per
+project and per request-context hash, and expire after a TTL.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation, and whitespace so trivially different prompts match."""
+    text = _NON_WORD.sub(" ", (prompt or "").lower())
+    return " ".join(text.split())
+
+
+def context_hash(*parts: Optional[str]) -> str:
+    """Stable hash over the request context an answer depends on."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class AnswerCache:
+    """TTL + LRU bounded cache of final ask answers."""
+
+    def __init__(
+        self,
+        *,
+        ttl_s: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._clock = clock
+        self.ttl_s = int(os.getenv("ASK_CACHE_TTL_S", "900")) if ttl_s is None else ttl_s
+        self.max_entries = (
+            int(os.getenv("ASK_CACHE_MAX_ENTRIES", "2048")) if max_entries is None else max_entries
+        )
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0 and self.max_entries > 0
+
+    @staticmethod
+    def _key(project_id: Optional[str], prompt: str, ctx_hash: str) -> Optional[CacheKey]:
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        return (project_id or "", ctx_hash, normalized)
+
+    def get(self, project_id: Optional[str], prompt: str, ctx_hash: str) -> Optional[str]:
+        """Return a cached answer for this prompt/context, or None."""
+        if not self.enabled:
+            return None
+        key = self._key(project_id, prompt, ctx_hash)
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, answer = entry
+        if self._clock() - stored_at > self.ttl_s:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def put(self, project_id: Optional[str], prompt: str, ctx_hash: str, answer: str) -> None:
+        """Store an answer; evicts the least recently used entries past the cap."""
+        if not self.enabled or not answer:
+            return
+        key = self._key(project_id, prompt, ctx_hash)
+        if key is None:
+            return
+        self._entries[key] = (self._clock(), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+answer_cache = AnswerCache()
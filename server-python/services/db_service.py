@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import json
 import logging
@@ -47,13 +48,30 @@ class DBConfig:
     """Database configuration used to initialize the asyncpg pool."""
 
     database_url: Optional[str] = None
-    min_size: int = 1
-    max_size: int = 5
+    # A couple of warm connections per process; enough headroom for a few
+    # concurrent chats, each issuing short reads (some from parallel tool calls).
+    min_size: int = 2
+    max_size: int = 10
     command_timeout: int = 60
+    max_queries: int = 50_000
+    max_inactive_connection_lifetime: float = 300.0
+    statement_cache_size: int = 1024
+
+    def __post_init__(self) -> None:
+        if self.max_size < self.min_size:
+            logger.warning(
+                f"⚠️  Pool max_size ({self.max_size}) is below min_size ({self.min_size}); "
+                f"using max_size={self.min_size}. Check PG_POOL_MIN / PG_POOL_MAX."
+            )
+            self.max_size = self.min_size
 
     @staticmethod
     def from_env() -> "DBConfig":
-        return DBConfig(database_url=os.getenv("DATABASE_URL"))
+        return DBConfig(
+            database_url=os.getenv("DATABASE_URL"),
+            min_size=int(os.getenv("PG_POOL_MIN", "2")),
+            max_size=int(os.getenv("PG_POOL_MAX", "10")),
+        )
 
     def resolve_url(self) -> str:
         if self.database_url:
@@ -67,6 +85,10 @@ class DBConfig:
         return f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
 
+# Placeholder config for services wrapping an existing pool; never used to connect.
+_POOL_ONLY_CONFIG = DBConfig()
+
+
 class DBService:
     """Thin wrapper around asyncpg for screenplay element queries."""
 
@@ -74,6 +96,13 @@ class DBService:
         self.config = config or DBConfig.from_env()
         self.pool: Optional[asyncpg.Pool] = None
 
+    @classmethod
+    def with_pool(cls, pool: asyncpg.Pool) -> "DBService":
+        """Wrap an already-open pool without re-reading DB settings from the environment."""
+        db = cls(config=_POOL_ONLY_CONFIG)
+        db.pool = pool
+        return db
+
     async def ensure_pool(self) -> None:
         if self.pool is not None:
             return
@@ -84,12 +113,26 @@ class DBService:
                 min_size=self.config.min_size,
                 max_size=self.config.max_size,
                 command_timeout=self.config.command_timeout,
+                max_queries=self.config.max_queries,
+                max_inactive_connection_lifetime=self.config.max_inactive_connection_lifetime,
+                statement_cache_size=self.config.statement_cache_size,
             )
             logger.info("✅ Database connection pool created")
         except Exception as e:
             logger.warning(f"⚠️  Database connection failed: {e}. Graph will use fallback mode.")
             self.pool = None
 
+    def pool_stats(self) -> Dict[str, int]:
+        """Current pool occupancy (all zeros when no pool is open)."""
+        if not self.pool:
+            return {"size": 0, "free": 0, "min_size": 0, "max_size": 0}
+        return {
+            "size": self.pool.get_size(),
+            "free": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+        }
+
     async def search_elements(
         self,
         project_id: str,
@@ -275,14 +318,17 @@ class DBService:
         limit = max(1, min(int(limit), 100))
 
         if search_terms:
-            hits = await self.search_elements(
-                project_id,
-                terms=search_terms,
-                match_mode="any",
-                element_types=["scene-heading"],
-                limit=limit,
+            # The search and the full numbering pass are independent; overlap them.
+            hits, all_scenes = await asyncio.gather(
+                self.search_elements(
+                    project_id,
+                    terms=search_terms,
+                    match_mode="any",
+                    element_types=["scene-heading"],
+                    limit=limit,
+                ),
+                self.list_scenes(project_id, limit=500),
             )
-            all_scenes = await self.list_scenes(project_id, limit=500)
             num_by_id = {s.element_id: s.scene_number for s in all_scenes}
             return [
                 SceneSummary(
@@ -347,11 +393,9 @@ class DBService:
         if not hits:
             return []
 
+        # Scene numbers come back with the enclosing scene, so no separate list_scenes round-trip.
         enriched = await self.fetch_elements_by_ids(project_id, [h.element_id for h in hits])
         hit_by_id = {h.element_id: h for h in hits}
-        all_scenes = await self.list_scenes(project_id, limit=500)
-        num_by_id = {s.element_id: s.scene_number for s in all_scenes}
-        heading_by_id = {s.element_id: s.heading for s in all_scenes}
 
         scenes: Dict[str, CharacterSceneMatch] = {}
         for el in enriched:
@@ -373,9 +417,9 @@ class DBService:
             if scene_id not in scenes:
                 scenes[scene_id] = CharacterSceneMatch(
                     scene_id=scene_id,
-                    scene_number=num_by_id.get(scene_id, 0),
+                    scene_number=int(el.get("scene_number") or 0),
                     element_index=int(el.get("element_index") or hit.element_index),
-                    heading=heading or heading_by_id.get(scene_id, "Unknown scene"),
+                    heading=heading or "Unknown scene",
                     match_count=0,
                     sample_matches=[],
                 )
@@ -510,6 +554,24 @@ class DBService:
             logger.error(f"[DB Context] ❌ Error extracting context: {error_msg}")
             return "", error_msg
 
+    async def project_version(self, project_id: str) -> Optional[str]:
+        """Last-saved stamp of a project (``projects.updated_at``), or None if unknown.
+
+        Every save bumps it, so it versions anything derived from project data.
+        """
+        await self.ensure_pool()
+        if not self.pool:
+            return None
+
+        try:
+            updated_at = await self.pool.fetchval(
+                "SELECT updated_at FROM projects WHERE id = $1::uuid", project_id
+            )
+            return updated_at.isoformat() if updated_at is not None else None
+        except Exception as e:
+            logger.error(f"[DB Version] ❌ Error reading project version: {type(e).__name__}: {e}")
+            return None
+
     async def verify_element_ids(self, project_id: str, element_ids: List[str]) -> Dict[str, bool]:
         """Verify that element IDs exist in the screenplay."""
         await self.ensure_pool()
@@ -614,6 +676,7 @@ class DBService:
         - element_type (str)
         - element_index (int)
         - content (str)
+        - scene_id / scene_heading / scene_number of the enclosing scene (or None)
         """
         await self.ensure_pool()
         if not self.pool:
@@ -632,30 +695,33 @@ class DBService:
                     FROM projects p,
                          LATERAL jsonb_array_elements(p.data->'elements') WITH ORDINALITY t(elem, ordinality)
                     WHERE p.id = $1::uuid
+                ),
+                scene_headings AS (
+                    SELECT
+                        element_id,
+                        element_index,
+                        content,
+                        row_number() OVER (ORDER BY element_index)::int AS scene_number
+                    FROM indexed_elements
+                    WHERE element_type = 'scene-heading'
                 )
                 SELECT
-                    element_id,
-                    element_type,
-                    element_index,
-                    content,
-                    (
-                        SELECT sh.element_id
-                        FROM indexed_elements sh
-                        WHERE sh.element_type = 'scene-heading'
-                          AND sh.element_index <= indexed_elements.element_index
-                        ORDER BY sh.element_index DESC
-                        LIMIT 1
-                    ) AS scene_id,
-                    (
-                        SELECT sh.content
-                        FROM indexed_elements sh
-                        WHERE sh.element_type = 'scene-heading'
-                          AND sh.element_index <= indexed_elements.element_index
-                        ORDER BY sh.element_index DESC
-                        LIMIT 1
-                    ) AS scene_heading
-                FROM indexed_elements
-                WHERE element_id = ANY($2::text[])
+                    e.element_id,
+                    e.element_type,
+                    e.element_index,
+                    e.content,
+                    sh.element_id AS scene_id,
+                    sh.content AS scene_heading,
+                    sh.scene_number
+                FROM indexed_elements e
+                LEFT JOIN LATERAL (
+                    SELECT s.element_id, s.content, s.scene_number
+                    FROM scene_headings s
+                    WHERE s.element_index <= e.element_index
+                    ORDER BY s.element_index DESC
+                    LIMIT 1
+                ) sh ON true
+                WHERE e.element_id = ANY($2::text[])
             """
             rows = await self.pool.fetch(query, project_id, element_ids)
             # Preserve input order
@@ -667,6 +733,7 @@ class DBService:
                     "content": r["content"] or "",
                     "scene_id": r.get("scene_id"),
                     "scene_heading": r.get("scene_heading"),
+                    "scene_number": r.get("scene_number"),
                 }
                 for r in rows
             }
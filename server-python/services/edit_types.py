@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 from services.plan_types import PlanState
+from services.search_helpers import SceneContextIndex
 
 
 class NewElementInput(BaseModel):
@@ -50,7 +51,7 @@ class BeatOperationInput(BaseModel):
 
 @dataclass
 class ScreenplayDeps:
-    scene_context: str
+    scene_context: str = ""
     project_id: Optional[str] = None
     db_pool: Optional[object] = None
     global_index: Optional[str] = None
@@ -60,3 +61,11 @@ class ScreenplayDeps:
     _plan: Optional[PlanState] = None
     _submitted_edits: List[Dict[str, Any]] = field(default_factory=list)
     _beat_ops: List[Dict[str, Any]] = field(default_factory=list)
+    _scene_index: Optional[SceneContextIndex] = None
+    _instructions_prefix: Optional[str] = None
+
+    def scene_index(self) -> SceneContextIndex:
+        """Line/header index over ``scene_context``, built once per request."""
+        if self._scene_index is None or self._scene_index.text is not self.scene_context:
+            self._scene_index = SceneContextIndex(self.scene_context)
+        return self._scene_index
@@ -0,0 +1,99 @@
+"""
+Fan-out of agent stream events to one or more SSE consumers.
+
+An agent run publishes its events onto an AgentEventBus; every request
+subscribed to the bus gets the full event history replayed followed by live
+events, so identical concurrent requests can share a single upstream run.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
+
+from services.edit_types import ScreenplayDeps
+from services.streaming import encode_event, encode_final_payload
+
+# (event, pre-encoded typed JSON as UTF-8 bytes)
+BusItem = Tuple[dict, bytes]
+
+
+@dataclass
+class AgentEventBus:
+    """One upstream agent run whose events are replayed to every subscriber.
+
+    Events are stored once; each subscriber is just a wakeup flag plus a read
+    cursor into ``events``, so a lagging client holds no extra memory and
+    never throttles the run for the others.
+    """
+
+    deps: ScreenplayDeps
+    task: Optional["asyncio.Task[str]"] = None
+    # The wire form is encoded once per event no matter how many subscribers
+    # replay it.
+    events: List[BusItem] = field(default_factory=list)
+    subscribers: List[asyncio.Event] = field(default_factory=list)
+    closed: bool = False
+    _edits_final: Optional[bytes] = None
+
+    async def publish(self, evt: dict) -> None:
+        """EmitFn-compatible sink for run_unified_agent_streaming."""
+        self.events.append((evt, encode_event(evt)))
+        for wake in self.subscribers:
+            wake.set()
+
+    def close(self) -> None:
+        """Wake every subscriber so it can observe the end of the stream."""
+        self.closed = True
+        for wake in self.subscribers:
+            wake.set()
+
+    def subscribe(self) -> asyncio.Event:
+        wake = asyncio.Event()
+        self.subscribers.append(wake)
+        return wake
+
+    @property
+    def joinable(self) -> bool:
+        """Whether a new request may attach: the run is live and not being cancelled."""
+        return self.task is not None and not self.task.done() and not self.task.cancelling()
+
+    def unsubscribe(self, wake: asyncio.Event) -> bool:
+        """Detach a subscriber; cancels the run when the last one leaves early.
+
+        Returns True if this call cancelled the run.
+        """
+        if wake not in self.subscribers:
+            return False
+        self.subscribers.remove(wake)
+        if not self.subscribers and self.task is not None and not self.task.done():
+            self.task.cancel()
+            return True
+        return False
+
+    def edits_final(self) -> bytes:
+        """Typed edit-mode final payload, encoded once for every subscriber.
+
+        Only valid once the run has finished and the submitted edits are settled.
+        """
+        if self._edits_final is None:
+            edits = self.deps._submitted_edits
+            self._edits_final = encode_final_payload(
+                applied_edits={"edits": edits} if edits else None,
+                beat_ops=self.deps._beat_ops or None,
+            )
+        return self._edits_final
+
+    async def drain(self, wake: asyncio.Event) -> AsyncIterator[List[BusItem]]:
+        """Yield a subscriber's events, batched by what has arrived, until the bus closes."""
+        cursor = 0
+        while True:
+            wake.clear()
+            if cursor < len(self.events):
+                batch = self.events[cursor:]
+                cursor += len(batch)
+                yield batch
+                continue
+            if self.closed:
+                return
+            await wake.wait()
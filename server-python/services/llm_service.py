@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import os
 import json
-import re
 import logging
 import sys
 import asyncio
-from typing import AsyncGenerator, Optional, List, Dict, Any
+import functools
+from typing import AsyncGenerator, Optional, List, Dict, Any, Union
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import asyncpg
@@ -16,11 +16,21 @@ from services.prompts import (
     CHAT_SYSTEM_PROMPT,
     EDIT_MODE_SYSTEM_PROMPT,
     COMMAND_SYSTEM_PROMPT,
+    prompt_cache_key,
 )
+from services.answer_cache import answer_cache, context_hash
+from services.beat_loop_helpers import BeatLoopState, build_beat_context
 from services.db_service import DBService
 from services.edit_types import ScreenplayDeps
-from services.streaming import format_buffer_item, format_final_payload, run_unified_agent_streaming
-from services.screenplay_agent import create_screenplay_agent
+from services.event_bus import AgentEventBus, BusItem
+from services.streaming import (
+    NO_OUTPUT_ANSWER,
+    encode_final_payload,
+    format_buffer_item,
+    format_final_payload,
+    run_unified_agent_streaming,
+)
+from services.screenplay_agent import get_screenplay_agent
 
 # Configure logging to stdout with immediate flushing
 logging.basicConfig(
@@ -35,16 +45,67 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
+_CHAT_ROLES = frozenset({"user", "assistant"})
+
+# Past this many shared runs, new requests still run but are not registered for dedupe.
+_MAX_INFLIGHT_RUNS = 1024
+
+
+async def _noop_emit(evt: dict) -> None:
+    pass
+
+
+def _final_chunk(stream_events: bool, **fields: Any) -> Union[str, bytes]:
+    """Final payload as a stream_chat chunk: bytes when typed, like agent events."""
+    if stream_events:
+        return encode_final_payload(**fields)
+    return format_final_payload(False, **fields)
+
+
+def _render_typed_batch(batch: List[BusItem]) -> bytes:
+    return b"\n".join(wire for _, wire in batch)
+
+
+def _render_text_batch(batch: List[BusItem]) -> str:
+    return "".join(format_buffer_item(evt, False) or "" for evt, _ in batch)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _parse_edits_payload(text: str) -> Optional[Dict[str, Any]]:
+    """Pull the ``{"edits": ...}`` object out of free-form model output.
+
+    For each ``"edits"`` occurrence (prose may mention the word before the
+    JSON), walks back to each enclosing ``{`` and decodes from there, rather
+    than running a backtracking regex over the whole response.
+    """
+    idx = text.find('"edits"')
+    while idx >= 0:
+        start = text.rfind("{", 0, idx)
+        while start >= 0:
+            try:
+                obj, _ = _JSON_DECODER.raw_decode(text, start)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict) and "edits" in obj:
+                return obj
+            start = text.rfind("{", 0, start)
+        idx = text.find('"edits"', idx + 1)
+    return None
+
+
 class LLMService:
     def __init__(self):
         api_key = os.getenv('OPENAI_API_KEY')
         if api_key and api_key != 'sk-your-key-here':
             self.openai = AsyncOpenAI(api_key=api_key)
             self.default_chat_model = os.getenv("AI_DEFAULT_CHAT_MODEL", "gpt-4.1").strip() or "gpt-4.1"
-            self._unified_agents: Dict[str, Any] = {}
         else:
             self.openai = None
-            self._unified_agents = {}
+
+        # Identical concurrent chat requests share one agent run.
+        self._inflight: Dict[str, AgentEventBus] = {}
 
         # DB access wrapper (pool is created on first use)
         self.db = DBService()
@@ -55,6 +116,10 @@ class LLMService:
         await self.db.ensure_pool()
         self.db_pool = self.db.pool
 
+    def pool_stats(self) -> Dict[str, int]:
+        """Connection pool occupancy for monitoring."""
+        return self.db.pool_stats()
+
     async def _search_elements(
         self,
         project_id: str,
@@ -139,27 +204,20 @@ class LLMService:
         return await self.db.verify_element_ids(project_id, element_ids)
 
     def _init_agents(self):
-        """No-op kept for compatibility."""
-        self._unified_agents = {}
+        """No-op kept for compatibility (agents are cached per model at module level)."""
 
     def _to_agent_input(self, messages: List[dict]) -> List[dict]:
         """Convert frontend chat messages to OpenAI Agents SDK input format."""
-        input_items: List[dict] = []
-        for msg in messages:
-            role = msg.get("role")
-            content = msg.get("content", "")
-            if role in ("user", "assistant") and content is not None:
-                input_items.append({"role": role, "content": str(content)})
-        return input_items
+        return [
+            {"role": role, "content": str(content)}
+            for msg in messages
+            if (role := msg.get("role")) in _CHAT_ROLES
+            and (content := msg.get("content", "")) is not None
+        ]
 
     def _ensure_unified_agent(self, model: str) -> Any:
         """Return (and lazily create) the unified screenplay agent for a model."""
-        model = self._normalize_chat_model(model)
-        if model in self._unified_agents:
-            return self._unified_agents[model]
-        agent = create_screenplay_agent(model)
-        self._unified_agents[model] = agent
-        return agent
+        return get_screenplay_agent(self._normalize_chat_model(model))
 
     # --- Model selection helpers (chat) ---
     def _allowed_chat_models(self) -> set[str]:
@@ -186,47 +244,68 @@ class LLMService:
         mode: str,
         model: str,
         stream_events: bool,
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[Union[str, bytes], None]:
         """Direct OpenAI chat completion fallback when the agent run fails."""
-        system_prompt = EDIT_MODE_SYSTEM_PROMPT if mode == "edit" else CHAT_SYSTEM_PROMPT
+        base_prompt = EDIT_MODE_SYSTEM_PROMPT if mode == "edit" else CHAT_SYSTEM_PROMPT
+        cache_key = prompt_cache_key(base_prompt)
+        system_prompt = base_prompt
         if scene_context:
             system_prompt += f"\n\nCurrent screenplay context:\n{scene_context}"
 
-        chat_messages: List[dict] = [{"role": "system", "content": system_prompt}]
-        for msg in messages:
-            if msg.get("role") in ("user", "assistant"):
-                chat_messages.append({"role": msg["role"], "content": msg.get("content", "")})
+        chat_messages: List[dict] = [
+            {"role": "system", "content": system_prompt},
+            *self._to_agent_input(messages),
+        ]
 
         if mode == "edit":
             response = await self.openai.chat.completions.create(
                 model=model,
                 messages=chat_messages,
                 temperature=0.7,
+                prompt_cache_key=cache_key,
             )
             text = response.choices[0].message.content or ""
-            json_candidate = text
-            m = re.search(r'\{[\s\S]*"edits"[\s\S]*\}', text, re.DOTALL)
-            if m:
-                json_candidate = m.group(0)
-            try:
-                applied_edits = json.loads(json_candidate)
-                if not isinstance(applied_edits, dict) or "edits" not in applied_edits:
-                    applied_edits = {"edits": []}
-            except Exception:
-                applied_edits = {"edits": []}
-            yield format_final_payload(stream_events, applied_edits=applied_edits)
+            applied_edits = _parse_edits_payload(text) or {"edits": []}
+            yield _final_chunk(stream_events, applied_edits=applied_edits)
             return
 
         stream = await self.openai.chat.completions.create(
             model=model,
             messages=chat_messages,
             temperature=0.7,
+            prompt_cache_key=cache_key,
             stream=True,
         )
-        async for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
+        # Closing the stream on exit (including client disconnect) stops upstream generation.
+        async with stream:
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield format_buffer_item({"type": "text_delta", "content": content}, stream_events)
+
+    @staticmethod
+    def _inflight_key(*parts: Optional[str]) -> str:
+        return context_hash(*parts)
+
+    def _forget_shared(self, run_key: str, shared: AgentEventBus) -> None:
+        if self._inflight.get(run_key) is shared:
+            del self._inflight[run_key]
+
+    def _finish_shared(self, run_key: str, shared: AgentEventBus, _task: "asyncio.Task[str]") -> None:
+        """Done-callback: runs whether the agent succeeded, raised, or was cancelled."""
+        self._forget_shared(run_key, shared)
+        shared.close()
+
+    def _leave_shared(self, run_key: str, shared: AgentEventBus, sub: asyncio.Event) -> bool:
+        """Unsubscribe; returns True if this cancelled the run.
+
+        A cancelled run is forgotten right away so an immediate retry of the same
+        request starts a fresh run instead of joining the dying one.
+        """
+        if not shared.unsubscribe(sub):
+            return False
+        self._forget_shared(run_key, shared)
+        return True
 
     def is_configured(self) -> bool:
         return self.openai is not None
@@ -262,13 +341,15 @@ class LLMService:
             ],
             max_tokens=150,
             temperature=0.7,
+            prompt_cache_key=prompt_cache_key(COMPLETION_SYSTEM_PROMPT),
             stream=True,
         )
 
-        async for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
+        async with stream:
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
 
     async def stream_chat(
         self,
@@ -283,90 +364,148 @@ class LLMService:
         context_policy: Optional[str] = None,
         context_element_ids: Optional[List[str]] = None,
         model: Optional[str] = None,
-    ) -> AsyncGenerator[str, None]:
-        """Chat response (streaming) using the OpenAI Agents SDK."""
+    ) -> AsyncGenerator[Union[str, bytes], None]:
+        """Chat response (streaming) using the OpenAI Agents SDK.
+
+        Typed agent events and the typed final payload arrive as UTF-8 bytes
+        (newline-separated JSON events, pre-encoded once per event); everything
+        else is str.
+        """
         if not self.openai:
             raise ValueError('OpenAI not configured. Add OPENAI_API_KEY to server/.env')
 
-        selected_model = self._normalize_chat_model(model)
-        effective_stream_events = True if stream_events is None else bool(stream_events)
         agent_input = self._to_agent_input(messages)
         if not agent_input:
             return
+        selected_model = self._normalize_chat_model(model)
+        effective_stream_events = True if stream_events is None else bool(stream_events)
 
-        try:
+        if project_id:
+            try:
+                await self._ensure_db_pool()
+            except Exception as db_error:
+                logger.warning(f"[unified_agent] DB unavailable: {db_error}")
+                self.db_pool = None
+
+        # Ask answers are reusable across near-duplicate prompts; selections are
+        # treated as sensitive and never cached. Tools read the whole project, so
+        # the key carries its last-saved stamp and any save invalidates it; if
+        # that stamp can't be read (e.g. no DB) the answer is not cached.
+        cache_prompt: Optional[str] = None
+        cache_ctx = ""
+        last = agent_input[-1]
+        if mode == "ask" and not selected_text and answer_cache.enabled and last.get("role") == "user":
+            project_version: Optional[str] = ""
             if project_id:
-                try:
-                    await self._ensure_db_pool()
-                except Exception as db_error:
-                    logger.warning(f"[unified_agent] DB unavailable: {db_error}")
-                    self.db_pool = None
-
-            ua = self._ensure_unified_agent(selected_model)
-            ua_context = ScreenplayDeps(
-                scene_context=scene_context or "",
-                project_id=project_id,
-                db_pool=self.db_pool,
-                global_index=global_index,
-                selected_element_id=selected_element_id,
-                selected_text=selected_text,
-            )
+                project_version = await self.db.project_version(project_id) if self.db_pool else None
+            if project_version is not None:
+                cache_prompt = last["content"]
+                cache_ctx = context_hash(
+                    selected_model,
+                    project_version,
+                    scene_context,
+                    global_index,
+                    selected_element_id,
+                    *(f"{m['role']}:{m['content']}" for m in agent_input[:-1]),
+                )
+                cached = answer_cache.get(project_id, cache_prompt, cache_ctx)
+                if cached is not None:
+                    logger.info("[unified_agent] answer cache hit")
+                    yield _final_chunk(effective_stream_events, content=cached)
+                    return
 
-            queue: "asyncio.Queue[dict]" = asyncio.Queue()
-
-            async def ua_emit(evt: dict) -> None:
-                await queue.put(evt)
-
-            async def _run_ua() -> str:
-                return await run_unified_agent_streaming(
-                    ua,
-                    agent_input,
-                    context=ua_context,
-                    emit=ua_emit,
-                    max_turns=15,
-                    trace_metadata={
-                        "tags": ["ai-service", "chat", mode],
-                        "mode": mode,
-                        "model": selected_model,
-                        "project_id": project_id or "",
-                    },
+        try:
+            run_key = self._inflight_key(
+                mode,
+                selected_model,
+                project_id,
+                scene_context,
+                global_index,
+                selected_element_id,
+                selected_text,
+                *(f"{m['role']}:{m['content']}" for m in agent_input),
+            )
+            shared = self._inflight.get(run_key)
+            if shared is None or not shared.joinable:
+                ua = self._ensure_unified_agent(selected_model)
+                shared = AgentEventBus(
+                    deps=ScreenplayDeps(
+                        scene_context=scene_context or "",
+                        project_id=project_id,
+                        db_pool=self.db_pool,
+                        global_index=global_index,
+                        selected_element_id=selected_element_id,
+                        selected_text=selected_text,
+                    )
+                )
+                if len(self._inflight) < _MAX_INFLIGHT_RUNS:
+                    self._inflight[run_key] = shared
+                shared.task = asyncio.create_task(
+                    run_unified_agent_streaming(
+                        ua,
+                        agent_input,
+                        context=shared.deps,
+                        emit=shared.publish,
+                        max_turns=15,
+                        trace_metadata={
+                            "tags": ["ai-service", "chat", mode],
+                            "mode": mode,
+                            "model": selected_model,
+                            "project_id": project_id or "",
+                        },
+                    )
                 )
+                shared.task.add_done_callback(functools.partial(self._finish_shared, run_key, shared))
+            else:
+                logger.info("[unified_agent] joining in-flight run for identical request")
 
-            ua_task = asyncio.create_task(_run_ua())
+            ua_context = shared.deps
+            ua_task = shared.task
+            sub = shared.subscribe()
 
             try:
-                while True:
-                    if ua_task.done() and queue.empty():
-                        break
-                    try:
-                        evt = await asyncio.wait_for(queue.get(), timeout=0.1)
-                    except asyncio.TimeoutError:
-                        continue
-                    rendered = format_buffer_item(evt, effective_stream_events)
+                # Events that piled up while the client was writing go out as one
+                # chunk: newline-separated JSON events, or concatenated text.
+                render = _render_typed_batch if effective_stream_events else _render_text_batch
+                async for batch in shared.drain(sub):
+                    rendered = render(batch)
                     if rendered:
                         yield rendered
 
-                answer = await ua_task
+                # The bus is closed by the task's done-callback, so the run has
+                # finished by the time drain() returns.
+                answer = ua_task.result()
             except asyncio.CancelledError:
-                logger.info("[unified_agent] client disconnected; cancelling agent task")
-                ua_task.cancel()
-                try:
-                    await ua_task
-                except asyncio.CancelledError:
-                    pass
-                raise
+                if self._leave_shared(run_key, shared, sub):
+                    logger.info("[unified_agent] client disconnected; cancelling agent task")
+                    try:
+                        await ua_task
+                    except asyncio.CancelledError:
+                        pass
+                    raise
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                # This request is still live; only the shared run it joined was
+                # cancelled from elsewhere. Answer it on its own.
+                raise RuntimeError("shared agent run was cancelled") from None
+            finally:
+                self._leave_shared(run_key, shared, sub)
 
             if mode == "edit" and (ua_context._submitted_edits or ua_context._beat_ops):
-                yield format_final_payload(
-                    effective_stream_events,
-                    applied_edits={"edits": ua_context._submitted_edits} if ua_context._submitted_edits else None,
-                    beat_ops=ua_context._beat_ops or None,
-                )
-            else:
                 if effective_stream_events:
-                    yield json.dumps({"type": "final", "content": answer})
+                    # Joined runs share one encoding of the (possibly large) edit set.
+                    yield shared.edits_final()
                 else:
-                    yield answer
+                    yield format_final_payload(
+                        False,
+                        applied_edits={"edits": ua_context._submitted_edits} if ua_context._submitted_edits else None,
+                        beat_ops=ua_context._beat_ops or None,
+                    )
+            else:
+                if cache_prompt and answer != NO_OUTPUT_ANSWER:
+                    answer_cache.put(project_id, cache_prompt, cache_ctx, answer)
+                yield _final_chunk(effective_stream_events, content=answer)
             return
         except Exception as ua_error:
             logger.exception(f"[unified_agent] error: {ua_error}")
@@ -403,14 +542,12 @@ class LLMService:
         if not agent_input:
             return
 
-        from services.beat_loop_helpers import build_beat_context, BeatLoopState as _BLS
-
         user_question = next(
             (str(msg.get("content", "")) for msg in reversed(messages) if msg.get("role") == "user"),
             "",
         )
 
-        beat_state = _BLS(
+        beat_state = BeatLoopState(
             question=user_question,
             beats=beats,
             act_names=act_names,
@@ -427,15 +564,11 @@ class LLMService:
 
         ua = self._ensure_unified_agent(selected_model)
         ua_context = ScreenplayDeps(
-            scene_context="",
             project_id=project_id,
             db_pool=self.db_pool if project_id else None,
             beat_context=beat_ctx,
         )
 
-        async def _noop_emit(evt: dict) -> None:
-            pass
-
         try:
             answer = await run_unified_agent_streaming(
                 ua,
@@ -459,31 +592,55 @@ class LLMService:
             error_response = json.dumps({"ops": [], "notes": f"Error: {str(e)}"})
             yield error_response
 
+    @staticmethod
+    def _command_messages(request) -> List[dict]:
+        context_str = '\n'.join([
+            f"[{el.type.upper()}] {el.content}"
+            for el in request.context[-5:]
+        ])
+        return [
+            {'role': 'system', 'content': COMMAND_SYSTEM_PROMPT},
+            {
+                'role': 'user',
+                'content': f'Context:\n{context_str}\n\nElement type: {request.elementType}\nCommand: "{request.command}"\nText to transform:\n{request.selectedText}\n\nOutput only the transformed text:'
+            }
+        ]
+
     async def execute_command(self, request) -> str:
         """Command execution (non-streaming) - kept as-is for now"""
         if not self.openai:
             raise ValueError('OpenAI not configured. Add OPENAI_API_KEY to server/.env')
 
-        context_str = '\n'.join(
-            f"[{el.type.upper()}] {el.content}"
-            for el in request.context[-5:]
-        )
-
         response = await self.openai.chat.completions.create(
             model='gpt-4.1',
-            messages=[
-                {'role': 'system', 'content': COMMAND_SYSTEM_PROMPT},
-                {
-                    'role': 'user',
-                    'content': f'Context:\n{context_str}\n\nElement type: {request.elementType}\nCommand: "{request.command}"\nText to transform:\n{request.selectedText}\n\nOutput only the transformed text:'
-                }
-            ],
+            messages=self._command_messages(request),
             max_tokens=500,
             temperature=0.7,
+            prompt_cache_key=prompt_cache_key(COMMAND_SYSTEM_PROMPT),
         )
 
         return response.choices[0].message.content or request.selectedText
 
+    async def execute_command_stream(self, request) -> AsyncGenerator[str, None]:
+        """Command execution (streaming): yields transformed text as it is generated."""
+        if not self.openai:
+            raise ValueError('OpenAI not configured. Add OPENAI_API_KEY to server/.env')
+
+        stream = await self.openai.chat.completions.create(
+            model='gpt-4.1',
+            messages=self._command_messages(request),
+            max_tokens=500,
+            temperature=0.7,
+            prompt_cache_key=prompt_cache_key(COMMAND_SYSTEM_PROMPT),
+            stream=True,
+        )
+
+        async with stream:
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+
 
 # Singleton instance
 llm_service = LLMService()
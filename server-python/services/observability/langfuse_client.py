@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
 import logging
 import os
-import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 try:
@@ -22,9 +26,27 @@ def _env_flag(name: str, default: bool = True) -> bool:
     return val.strip().lower() not in {"0", "false", "no", "off"}
 
 
+def _env_rate(name: str, default: float = 1.0) -> float:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    try:
+        return min(1.0, max(0.0, float(val)))
+    except ValueError:
+        return default
+
+
+@functools.lru_cache(maxsize=64)
+def _tool_span_names(tool_name: str) -> tuple[str, str]:
+    # Tool names are a small closed set; format the call/result span names once each.
+    return f"tool:{tool_name}", f"tool-result:{tool_name}"
+
+
 @dataclass
 class LangfuseCtx:
     trace_id: str
+    # Sampling is decided once per trace; unsampled traces skip every SDK call.
+    sampled: bool = True
 
 
 class LangfuseClient:
@@ -33,6 +55,8 @@ class LangfuseClient:
     def __init__(self) -> None:
         self.enabled = _env_flag("LANGFUSE_ENABLED", True)
         self.log_content = _env_flag("LANGFUSE_LOG_CONTENT", False)
+        self.sample_rate = _env_rate("LANGFUSE_SAMPLE_RATE", 1.0)
+        self._executor: Optional[ThreadPoolExecutor] = None
 
         if not self.enabled or Langfuse is None:
             self._client = None
@@ -48,6 +72,23 @@ class LangfuseClient:
         else:
             self._client = Langfuse()
 
+        # One worker keeps SDK calls off the event loop and in submission order.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="langfuse")
+
+    @property
+    def is_active(self) -> bool:
+        """True when tracing calls will reach the SDK (enabled and constructed)."""
+        return self._client is not None
+
+    def _in_sample(self, trace_id: str) -> bool:
+        """Consistent-hash sampling: a given trace id is always in or always out."""
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0:
+            return False
+        digest = hashlib.blake2b(trace_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2**64 < self.sample_rate
+
     def start_trace(
         self,
         *,
@@ -58,12 +99,16 @@ class LangfuseClient:
     ) -> Optional[LangfuseCtx]:
         if not self._client:
             return None
+        new_id = str(uuid.uuid4())
+        if not self._in_sample(new_id):
+            return LangfuseCtx(trace_id=new_id, sampled=False)
         trace = self._client.trace(
+            id=new_id,
             name=name,
             metadata=metadata or None,
             input=input if self.log_content else None,
             tags=tags or None,
-            timestamp=time.time(),
+            timestamp=datetime.now(timezone.utc),
         )
         trace_id = getattr(trace, "id", None) or getattr(trace, "trace_id", None)
         if not trace_id:
@@ -72,7 +117,7 @@ class LangfuseClient:
         return LangfuseCtx(trace_id=str(trace_id))
 
     def end_trace(self, ctx: Optional[LangfuseCtx], *, output: Optional[Any] = None) -> None:
-        if not self._client or not ctx:
+        if not self._client or not ctx or not ctx.sampled:
             return
         # Langfuse doesn't require explicit trace end; we attach output by updating the trace.
         try:
@@ -93,7 +138,7 @@ class LangfuseClient:
         parent_observation_id: Optional[str] = None,
     ) -> Optional[str]:
         """Create a span. Returns span id if available."""
-        if not self._client or not ctx:
+        if not self._client or not ctx or not ctx.sampled:
             return None
         span = self._client.span(
             trace_id=ctx.trace_id,
@@ -108,6 +153,12 @@ class LangfuseClient:
         span_id = getattr(span, "id", None) or getattr(span, "span_id", None)
         return str(span_id) if span_id else None
 
+    def log_agent_run_background(self, **kwargs: Any) -> None:
+        """Queue ``log_agent_run`` on the Langfuse worker thread; returns immediately."""
+        if not self.is_active or self._executor is None:
+            return
+        self._executor.submit(self.log_agent_run, **kwargs)
+
     def log_agent_run(
         self,
         *,
@@ -117,24 +168,32 @@ class LangfuseClient:
         run_items: List[Any],
         metadata: Optional[Dict[str, Any]] = None,
         tags: Optional[List[str]] = None,
+        timestamp: Optional[datetime] = None,
     ) -> None:
         """Log a complete OpenAI Agents SDK run to Langfuse.
 
         Parses ``RunResult.new_items`` and creates:
-        - A root **trace** (input=prompt, output=answer).
+        - A root **trace** (input=prompt, output=answer), stamped with
+          ``timestamp`` (the run's start) rather than when this worker gets to it.
         - A child **generation** for each assistant message output item.
         - A child **span** for each tool call and tool output item.
         """
         if not self._client:
             return
 
+        new_id = str(uuid.uuid4())
+        if not self._in_sample(new_id):
+            return
+
         try:
             trace = self._client.trace(
+                id=new_id,
                 name=name,
                 input=input_prompt,
                 output=output_text,
                 metadata=metadata,
                 tags=tags,
+                timestamp=timestamp,
             )
             trace_id = getattr(trace, "id", None) or getattr(trace, "trace_id", None)
             if not trace_id:
@@ -164,7 +223,7 @@ class LangfuseClient:
                     }
                     self._client.span(
                         trace_id=trace_id,
-                        name=f"tool:{tool_name}",
+                        name=_tool_span_names(tool_name)[0],
                         input=self._safe_serialize(args),
                         metadata={"step": step, "tool_call_id": tool_call_id},
                     )
@@ -177,7 +236,7 @@ class LangfuseClient:
                     step_num = call_info.get("step", step)
                     self._client.span(
                         trace_id=trace_id,
-                        name=f"tool-result:{tool_name}",
+                        name=_tool_span_names(tool_name)[1],
                         output=self._safe_serialize(output, max_len=4000),
                         metadata={"step": step_num, "tool_call_id": tool_call_id},
                     )
@@ -197,7 +256,8 @@ class LangfuseClient:
                         metadata={"step": step},
                     )
 
-            self._client.flush()
+            # No flush here: the SDK's background consumer batches uploads.
+            # flush() blocks on network I/O and is only called at shutdown.
 
         except Exception as e:
             logger.warning(f"[Langfuse] log_agent_run failed: {e}")
@@ -224,7 +284,11 @@ class LangfuseClient:
         if not self._client:
             return
         try:
-            self._client.flush()
+            if self._executor is not None:
+                # Run behind any queued log_agent_run jobs so they are included.
+                self._executor.submit(self._client.flush).result()
+            else:
+                self._client.flush()
         except Exception:
             pass
 
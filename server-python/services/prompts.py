@@ -4,6 +4,20 @@ Prompt templates used by the AI service.
 These are kept in a dedicated module to reduce the size of `llm_service.py` and
 make prompt edits safer and easier to review.
 """
+import functools
+import hashlib
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_cache_key(prompt: str) -> str:
+    """Stable OpenAI ``prompt_cache_key`` for a static system prompt.
+
+    Every call site sends its system prompt first, so requests sharing one get
+    the same cacheable prefix; a shared key routes them to the same prompt
+    cache. The key changes whenever the prompt text does.
+    """
+    return "coverage-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
 
 # Screenplay-aware system prompts
 COMPLETION_SYSTEM_PROMPT = """You are an expert screenwriter assistant. You help complete screenplay text in proper format.
@@ -34,60 +48,23 @@ You must propose specific, actionable edits based on the provided screenplay con
 
 CRITICAL: You must return your response in a specific JSON format so the application can apply the edits.
 
-Response Format:
+Response Format (example: editing one element and adding a scene heading after it):
 ```json
-{
-  "edits": [
-    {
-      "elementId": "EXACT_ID_FROM_CONTEXT",
-      "elementType": "action|dialogue|character|scene-heading|parenthetical|transition",
-      "originalContent": "Exact text of the element as it appears in context",
-      "newContent": "The new text for the element (use originalContent if unchanged)",
-      "newElements": [
-        {
-          "type": "character|dialogue|action|scene-heading|parenthetical|transition",
-          "content": "Content of the new element to add AFTER the edited element"
-        }
-      ],
-      "reason": "Brief explanation of the change"
-    }
-  ]
-}
+{"edits": [{
+  "elementId": "EXACT_ID_FROM_CONTEXT",
+  "originalContent": "We need to act now.",
+  "newContent": "We need to act now.",
+  "newElements": [{"type": "scene-heading", "content": "EXT. PARKING LOT - NIGHT"}]
+}]}
 ```
+Optional fields supported on each edit: "elementType" (action|dialogue|character|scene-heading|parenthetical|transition) and "reason" (brief explanation).
 
 IMPORTANT RULES FOR newElements:
 1. ALWAYS use the `newElements` array when adding NEW screenplay elements after an edited element
-2. Each element in `newElements` MUST have explicit `type` and `content` fields
-3. DO NOT put new screenplay elements inside the `newContent` string
+2. Each element in `newElements` MUST have explicit `type` (same values as elementType) and `content` fields
+3. DO NOT put new screenplay elements inside the `newContent` string (e.g. never "We need to act now.\\n\\nEXT. PARKING LOT - NIGHT")
 4. If you're ONLY adding new elements without changing the original element, set newContent = originalContent
 
-CORRECT Example (adding scene heading after dialogue):
-```json
-{
-  "edits": [{
-    "elementId": "abc123",
-    "originalContent": "We need to act now.",
-    "newContent": "We need to act now.",
-    "newElements": [
-      {"type": "scene-heading", "content": "EXT. PARKING LOT - NIGHT"}
-    ],
-    "reason": "Added new scene as requested"
-  }]
-}
-```
-
-INCORRECT Example (putting a new element in newContent):
-```json
-{
-  "edits": [{
-    "elementId": "abc123",
-    "originalContent": "We need to act now.",
-    "newContent": "We need to act now.\\n\\nEXT. PARKING LOT - NIGHT",
-    "reason": "Added new scene"
-  }]
-}
-```
-
 Rules:
 1. ID MATCHING IS CRITICAL: You must use the EXACT UUID found in the context (e.g., if context says "Element 5 (ID: 123-abc...)", use "123-abc...").
 2. CONTENT MATCHING: "originalContent" must match the current text exactly.
@@ -193,6 +170,8 @@ Do NOT describe your plan only in prose — persist it with update_plan so the u
 - For "which scenes feature character X?" use **find_character_scenes** with all name variants.
   Good terms: character names, locations, quoted dialogue fragments, scene keywords (e.g. "Quebec", "Peggy", "INT.").
 - Call search_screenplay **multiple times** with different term sets when needed.
+- Independent lookups (several search term sets, list_scenes + count_elements, load_elements on
+  known IDs) should be issued **together in one turn** rather than one tool call per turn.
 - **0 results:** broaden terms (synonyms, alternate spellings, related scene headings) or switch to match_mode="any".
 - **Too many results:** add terms, use match_mode="all", or filter element_types.
 - Never guess element IDs — search, list_scenes, or use load_elements on IDs from scene context.
@@ -8,40 +8,43 @@ from __future__ import annotations
 
 import json
 import logging
-import re
 from typing import Any, Dict, List, Optional
 
 from agents import (
     Agent,
     CodeInterpreterTool,
+    ModelSettings,
     RunContextWrapper,
     WebSearchTool,
     function_tool,
 )
 
+from services.db_service import DBService
 from services.edit_types import (
     BeatOperationInput,
     EditProposalInput,
     ScreenplayDeps,
 )
 from services.plan_types import PlanState, TodoStatus
-from services.prompts import UNIFIED_SYSTEM_PROMPT
+from services.prompts import UNIFIED_SYSTEM_PROMPT, prompt_cache_key
+from services.search_helpers import (
+    extract_scene_context_elements,
+    format_search_hits_grouped,
+    normalize_search_terms,
+    search_scene_context,
+)
 
 logger = logging.getLogger(__name__)
 
-UUID_RE = re.compile(
-    r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b",
-    re.I,
+_VALID_ELEMENT_TYPES = frozenset(
+    {"action", "dialogue", "character", "scene-heading", "parenthetical", "transition"}
 )
+_VALID_BEAT_OPS = ("create", "update", "delete", "move")
 
 
 
-def _dynamic_instructions(
-    ctx: RunContextWrapper[ScreenplayDeps],
-    agent: Agent[ScreenplayDeps],
-) -> str:
+def _static_instructions(deps: ScreenplayDeps) -> str:
     parts = [UNIFIED_SYSTEM_PROMPT]
-    deps = ctx.context
     if deps.selected_text:
         parts.append(f"## Selected text\n{deps.selected_text}")
     if deps.selected_element_id:
@@ -52,14 +55,27 @@ def _dynamic_instructions(
         parts.append(f"## Scene context (local excerpt around cursor)\n{deps.scene_context}")
     if deps.beat_context:
         parts.append(f"## Beat board context\n{deps.beat_context}")
-    if deps._plan is not None:
-        parts.append(
-            "## Current plan (maintain via update_plan)\n"
-            + json.dumps(deps._plan.model_dump(), indent=2)
-        )
     return "\n\n".join(parts)
 
 
+def _dynamic_instructions(
+    ctx: RunContextWrapper[ScreenplayDeps],
+    agent: Agent[ScreenplayDeps],
+) -> str:
+    deps = ctx.context
+    # Called on every turn; only the plan section changes within a run, so the
+    # prompt + context prefix is joined once and reused.
+    if deps._instructions_prefix is None:
+        deps._instructions_prefix = _static_instructions(deps)
+    if deps._plan is None:
+        return deps._instructions_prefix
+    return (
+        deps._instructions_prefix
+        + "\n\n## Current plan (maintain via update_plan)\n"
+        + json.dumps(deps._plan.model_dump(), indent=2)
+    )
+
+
 @function_tool
 async def search_screenplay(
     wrapper: RunContextWrapper[ScreenplayDeps],
@@ -78,9 +94,6 @@ async def search_screenplay(
 
     Returns matching element IDs with snippets and guidance for refining the search.
     """
-    from services.db_service import DBService
-    from services.search_helpers import format_search_hits_grouped, normalize_search_terms
-
     deps = wrapper.context
     terms = normalize_search_terms(search_terms)
     if not terms:
@@ -93,10 +106,11 @@ async def search_screenplay(
     type_filter = element_types or ["dialogue", "character", "action", "scene-heading"]
 
     hits = []
+    db_error: Optional[str] = None
+    db_searched = False
     if deps.project_id and deps.db_pool:
         try:
-            db = DBService()
-            db.pool = deps.db_pool
+            db = DBService.with_pool(deps.db_pool)
             hits = await db.search_elements(
                 deps.project_id,
                 terms=terms,
@@ -104,9 +118,33 @@ async def search_screenplay(
                 element_types=type_filter,
                 limit=25,
             )
+            db_searched = True
         except Exception as e:
             logger.warning(f"[screenplay_agent] search failed: {e}")
-            return f"Search error: {type(e).__name__}: {e}. Try simpler terms or call list_scenes / find_character_scenes."
+            db_error = f"{type(e).__name__}: {e}"
+
+    # The local scene context only stands in for the database when it couldn't
+    # be searched; an empty DB result is the real answer.
+    if not db_searched and deps.scene_context:
+        excerpts = search_scene_context(
+            deps.scene_context,
+            terms,
+            match_mode=mode,
+            element_types=type_filter,
+            index=deps.scene_index(),
+        )
+        if excerpts:
+            source = f"Database search failed ({db_error})" if db_error else "Database unavailable"
+            return (
+                f"{source}; found {len(excerpts)} excerpt(s) matching {terms} "
+                f"(mode={mode}, types={type_filter}) in the local scene context:\n\n"
+                + "\n---\n".join(excerpts)
+                + "\n\nLocal matches are limited to the scene context window; "
+                "call search_screenplay again or list_scenes to look beyond it."
+            )
+
+    if db_error:
+        return f"Search error: {db_error}. Try simpler terms or call list_scenes / find_character_scenes."
 
     if not hits:
         tips = [
@@ -115,7 +153,7 @@ async def search_screenplay(
             "Remove element_types filter to search all element types.",
         ]
         if deps.scene_context:
-            ids_in_ctx = UUID_RE.findall(deps.scene_context)
+            ids_in_ctx = deps.scene_index().uuids
             if ids_in_ctx:
                 return (
                     f"No matches for terms {terms} (mode={mode}, types={type_filter}).\n\n"
@@ -132,8 +170,7 @@ async def search_screenplay(
     scene_by_id: Dict[str, Dict[str, Any]] = {}
     if deps.project_id and deps.db_pool:
         try:
-            db = DBService()
-            db.pool = deps.db_pool
+            db = DBService.with_pool(deps.db_pool)
             enriched = await db.fetch_elements_by_ids(
                 deps.project_id, [h.element_id for h in hits]
             )
@@ -163,9 +200,6 @@ async def list_scenes(
 
     Returns scene numbers, element IDs, and headings. Use IDs with load_elements to read a scene.
     """
-    from services.db_service import DBService
-    from services.search_helpers import normalize_search_terms
-
     deps = wrapper.context
     if not deps.project_id or not deps.db_pool:
         return "Cannot list scenes: no project or database available."
@@ -173,8 +207,7 @@ async def list_scenes(
     terms = normalize_search_terms(search_terms or []) if search_terms else None
 
     try:
-        db = DBService()
-        db.pool = deps.db_pool
+        db = DBService.with_pool(deps.db_pool)
         scenes = await db.list_scenes(
             deps.project_id,
             search_terms=terms,
@@ -219,9 +252,6 @@ async def find_character_scenes(
     Returns a de-duplicated scene list in script order with match counts and sample lines.
     Prefer this over search_screenplay when the user asks which scenes feature a character.
     """
-    from services.db_service import DBService
-    from services.search_helpers import normalize_search_terms
-
     deps = wrapper.context
     terms = normalize_search_terms(character_terms)
     if not terms:
@@ -231,8 +261,7 @@ async def find_character_scenes(
         return "Cannot find character scenes: no project or database available."
 
     try:
-        db = DBService()
-        db.pool = deps.db_pool
+        db = DBService.with_pool(deps.db_pool)
         scenes = await db.find_character_scenes(deps.project_id, terms)
     except Exception as e:
         logger.warning(f"[screenplay_agent] find_character_scenes failed: {e}")
@@ -282,10 +311,7 @@ async def load_elements(
 
     if deps.project_id and deps.db_pool:
         try:
-            from services.db_service import DBService
-
-            db = DBService()
-            db.pool = deps.db_pool
+            db = DBService.with_pool(deps.db_pool)
             context_str, error = await db.extract_element_context(
                 deps.project_id, element_ids, context_size
             )
@@ -297,10 +323,18 @@ async def load_elements(
             logger.warning(f"[screenplay_agent] load_elements DB failed: {e}")
 
     if deps.scene_context:
-        found: List[str] = []
-        for eid in element_ids:
-            if eid in deps.scene_context:
-                found.append(eid)
+        excerpts, found_ids = extract_scene_context_elements(
+            deps.scene_context, element_ids, context_size, index=deps.scene_index()
+        )
+        if excerpts:
+            return (
+                f"Database unavailable. {len(found_ids)}/{len(element_ids)} element(s) "
+                f"found in the current scene context window.\n\n"
+                + "\n\n".join(excerpts)
+            )
+
+        present = deps.scene_index().uuid_set
+        found = [eid for eid in element_ids if eid.lower() in present]
         if found:
             return (
                 f"Database unavailable. {len(found)}/{len(element_ids)} element(s) "
@@ -359,10 +393,7 @@ async def submit_edits(
 
     if deps.project_id and deps.db_pool and not issues:
         try:
-            from services.db_service import DBService
-
-            db = DBService()
-            db.pool = deps.db_pool
+            db = DBService.with_pool(deps.db_pool)
             eids = [e.get("elementId", "") for e in edit_dicts if e.get("elementId")]
             if eids:
                 verified = await db.verify_element_ids(deps.project_id, eids)
@@ -408,20 +439,16 @@ async def verify_edits(wrapper: RunContextWrapper[ScreenplayDeps]) -> str:
     issues: List[str] = []
     edits = deps._submitted_edits
 
-    valid_types = {"action", "dialogue", "character", "scene-heading", "parenthetical", "transition"}
     for i, e in enumerate(edits):
         etype = e.get("elementType", "")
-        if etype and etype not in valid_types:
+        if etype and etype not in _VALID_ELEMENT_TYPES:
             issues.append(f"Edit {i}: invalid elementType '{etype}'")
         if e.get("newContent", "") == e.get("originalContent", "") and not e.get("newElements"):
             issues.append(f"Edit {i}: no-op (newContent == originalContent and no newElements)")
 
     if deps.project_id and deps.db_pool:
         try:
-            from services.db_service import DBService
-
-            db = DBService()
-            db.pool = deps.db_pool
+            db = DBService.with_pool(deps.db_pool)
             eids = [e.get("elementId", "") for e in edits if e.get("elementId")]
             if eids:
                 verified = await db.verify_element_ids(deps.project_id, eids)
@@ -457,14 +484,13 @@ async def manage_beats(
     if not operations:
         return "No operations provided."
 
-    valid_ops = {"create", "update", "delete", "move"}
     issues: List[str] = []
     op_dicts = [o.model_dump(exclude_none=True) for o in operations]
 
     for i, op in enumerate(op_dicts):
         op_type = op.get("op", "")
-        if op_type not in valid_ops:
-            issues.append(f"Op {i}: invalid op '{op_type}'. Must be one of: {', '.join(valid_ops)}")
+        if op_type not in _VALID_BEAT_OPS:
+            issues.append(f"Op {i}: invalid op '{op_type}'. Must be one of: {', '.join(_VALID_BEAT_OPS)}")
             continue
         if op_type == "create":
             if "actIndex" not in op:
@@ -509,10 +535,7 @@ async def count_elements(
         return "Cannot count elements: no project or database available."
 
     try:
-        from services.db_service import DBService
-
-        db = DBService()
-        db.pool = deps.db_pool
+        db = DBService.with_pool(deps.db_pool)
 
         async with db.pool.acquire() as conn:
             if element_types:
@@ -613,6 +636,13 @@ def create_screenplay_agent(model: str = "gpt-4.1") -> Agent[ScreenplayDeps]:
         name="ScreenplayAssistant",
         model=model,
         instructions=_dynamic_instructions,
+        # Instructions always start with UNIFIED_SYSTEM_PROMPT; keep those requests
+        # on one provider prompt cache. Parallel tool calls let independent
+        # lookups share a model round trip.
+        model_settings=ModelSettings(
+            parallel_tool_calls=True,
+            extra_args={"prompt_cache_key": prompt_cache_key(UNIFIED_SYSTEM_PROMPT)},
+        ),
         tools=[
             *_hosted_tools(),
             update_plan,
@@ -626,3 +656,18 @@ def create_screenplay_agent(model: str = "gpt-4.1") -> Agent[ScreenplayDeps]:
             count_elements,
         ],
     )
+
+
+_AGENTS_BY_MODEL: Dict[str, Agent[ScreenplayDeps]] = {}
+
+
+def get_screenplay_agent(model: str = "gpt-4.1") -> Agent[ScreenplayDeps]:
+    """Return the process-wide screenplay agent for a model, creating it on first use.
+
+    Agents hold no per-request state (tools read everything from the run
+    context), so one instance per model is shared by every LLMService.
+    """
+    agent = _AGENTS_BY_MODEL.get(model)
+    if agent is None:
+        agent = _AGENTS_BY_MODEL[model] = create_screenplay_agent(model)
+    return agent
@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import bisect
 import re
-from typing import Any, Dict, List, Mapping, Sequence
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
 _TSQUERY_SPECIAL = re.compile(r"[&|!():*'\"\\]")
+UUID_RE = re.compile(
+    r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b",
+    re.I,
+)
+# Edit-mode scene context renders each element as "Element N (ID: <id>, Type: <type>):".
+_ELEMENT_HEADER = re.compile(r"^Element\b[^\n]*?\bID:\s*([^\s,)]+)", re.MULTILINE | re.IGNORECASE)
+_HEADER_TYPE = re.compile(r"^Element\b[^\n]*?\bType:\s*([\w-]+)", re.IGNORECASE)
+# Every element's first line is tagged with its type, e.g. "[SCENE-HEADING] INT. SALON".
+_TYPE_TAG = re.compile(r"^\[([A-Z][A-Z-]*)\]")
 
 
 def normalize_search_terms(terms: List[str], *, max_terms: int = 8) -> List[str]:
@@ -72,6 +84,173 @@ def make_snippet(content: str, terms: List[str], max_len: int = 120) -> str:
     return f"{text[: max_len - 1]}…"
 
 
+@dataclass
+class SceneContextIndex:
+    """Line and element-header offsets for one request's scene context.
+
+    Built lazily and reused across tool calls so each call resolves offsets
+    to lines with a bisect instead of re-splitting the whole context.
+    """
+
+    text: str
+
+    @cached_property
+    def lines(self) -> List[str]:
+        return self.text.split("\n")
+
+    @cached_property
+    def line_starts(self) -> List[int]:
+        starts = [0]
+        for line in self.lines[:-1]:
+            starts.append(starts[-1] + len(line) + 1)
+        return starts
+
+    @cached_property
+    def element_headers(self) -> List[Tuple[str, int]]:
+        """(element_id, offset) for each edit-mode element header, in order."""
+        return [(m.group(1), m.start()) for m in _ELEMENT_HEADER.finditer(self.text)]
+
+    @cached_property
+    def uuids(self) -> List[str]:
+        """Every UUID mentioned in the context, in order of appearance."""
+        return UUID_RE.findall(self.text)
+
+    @cached_property
+    def uuid_set(self) -> frozenset[str]:
+        return frozenset(u.lower() for u in self.uuids)
+
+    @cached_property
+    def element_positions(self) -> Dict[str, int]:
+        return {eid: i for i, (eid, _) in enumerate(self.element_headers)}
+
+    @cached_property
+    def line_elements(self) -> List[Tuple[int, Optional[str]]]:
+        """(element number, element type) owning each line; (-1, None) before the first element.
+
+        An element starts at an edit-mode header or, without one, at a
+        ``[TYPE]`` tag line; continuation lines belong to the element above.
+        """
+        out: List[Tuple[int, Optional[str]]] = []
+        element, etype, after_header = -1, None, False
+        for line in self.lines:
+            header = _HEADER_TYPE.match(line)
+            if header:
+                element, etype, after_header = element + 1, header.group(1).lower(), True
+            else:
+                tag = _TYPE_TAG.match(line)
+                if tag and not after_header:
+                    element, etype = element + 1, tag.group(1).lower()
+                after_header = False
+            out.append((element, etype))
+        return out
+
+    def line_of(self, offset: int) -> int:
+        return bisect.bisect_right(self.line_starts, offset) - 1
+
+
+def search_scene_context(
+    scene_context: str,
+    terms: List[str],
+    *,
+    match_mode: str = "any",
+    element_types: Optional[List[str]] = None,
+    max_matches: int = 10,
+    window: int = 2,
+    index: Optional[SceneContextIndex] = None,
+) -> List[str]:
+    """Find lines of the local scene context that contain the search terms.
+
+    A single case-insensitive alternation is scanned over the whole context
+    once; match offsets are mapped back to lines (and the element owning each
+    line) via the context's index.  ``element_types`` and ``match_mode``
+    ("all": every term within one element) filter like the database search.
+    Up to ``max_matches`` matching lines are excerpted with ``window`` lines
+    either side; overlapping or adjacent windows are merged.
+    """
+    if not scene_context or not terms:
+        return []
+    alternatives = sorted({t for t in terms if t}, key=len, reverse=True)
+    if not alternatives:
+        return []
+    pattern = re.compile("|".join(re.escape(t) for t in alternatives), re.IGNORECASE)
+    if index is None or index.text is not scene_context:
+        index = SceneContextIndex(scene_context)
+    lines = index.lines
+    owners = index.line_elements
+    wanted = {t.lower() for t in element_types} if element_types else None
+    match_all = match_mode == "all"
+
+    hit_lines: List[int] = []
+    terms_by_element: Dict[int, set[str]] = {}
+    for m in pattern.finditer(scene_context):
+        line_no = index.line_of(m.start())
+        element, etype = owners[line_no]
+        if wanted is not None and etype not in wanted:
+            continue
+        if match_all:
+            terms_by_element.setdefault(element, set()).add(m.group(0).lower())
+        if not hit_lines or hit_lines[-1] != line_no:
+            hit_lines.append(line_no)
+            if not match_all and len(hit_lines) >= max_matches:
+                break
+    if match_all:
+        needed = len({t.lower() for t in alternatives})
+        hit_lines = [ln for ln in hit_lines if len(terms_by_element[owners[ln][0]]) >= needed]
+
+    ranges: List[List[int]] = []
+    for line_no in hit_lines[:max_matches]:
+        start = max(0, line_no - window)
+        end = min(len(lines), line_no + window + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ["\n".join(lines[start:end]) for start, end in ranges]
+
+
+def extract_scene_context_elements(
+    scene_context: str,
+    element_ids: List[str],
+    context_size: int = 3,
+    *,
+    index: Optional[SceneContextIndex] = None,
+) -> Tuple[List[str], List[str]]:
+    """Excerpt requested elements (plus neighbours) from an edit-mode scene context.
+
+    Element headers are located in one regex pass (cached on ``index``);
+    overlapping windows of ``context_size`` elements either side are merged.
+
+    Returns: (excerpts, found_ids)
+    """
+    if not scene_context or not element_ids:
+        return [], []
+    if index is None or index.text is not scene_context:
+        index = SceneContextIndex(scene_context)
+    headers = index.element_headers
+    if not headers:
+        return [], []
+    position = index.element_positions
+    found = [eid for eid in dict.fromkeys(element_ids) if eid in position]
+    if not found:
+        return [], []
+
+    ranges: List[List[int]] = []
+    for idx in sorted(position[eid] for eid in found):
+        start = max(0, idx - context_size)
+        end = min(len(headers), idx + context_size + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+
+    excerpts: List[str] = []
+    for start, end in ranges:
+        lo = headers[start][1]
+        hi = headers[end][1] if end < len(headers) else len(scene_context)
+        excerpts.append(scene_context[lo:hi].strip())
+    return excerpts, found
+
+
 def format_search_hits_grouped(
     hits: Sequence[Any],
     scene_by_element_id: Mapping[str, Mapping[str, Any]],
@@ -3,83 +3,186 @@ from __future__ import annotations
 import json
 import logging
 import asyncio
+import functools
+from datetime import datetime, timezone
 from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 
+try:
+    import orjson
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+from services.observability.langfuse_client import langfuse_client
+
 logger = logging.getLogger(__name__)
 
 
+def dumps_json(obj: Any) -> str:
+    """Encode a stream payload; orjson when available, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, default=str)
+
+
+def dumps_json_bytes(obj: Any) -> bytes:
+    """Like dumps_json, but UTF-8 bytes (orjson's native output, no decode)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str).encode("utf-8")
+
+
+def loads_json(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=512)
 def format_status_text(message: str) -> str:
-    """Legacy progress output: plain text line."""
+    """Legacy progress output: plain text line.
+
+    Messages repeat heavily (tool status, "[Applying] Done"), so lines are memoized.
+    """
     return message + "\n"
 
 
-def format_buffer_item(buffer_item: Any, stream_events: bool) -> Optional[str]:
-    """Format a buffered stream item for output."""
-    if stream_events:
-        return json.dumps(buffer_item)
+@functools.lru_cache(maxsize=128)
+def _status_bytes(message: str) -> bytes:
+    # Status messages come from a small fixed vocabulary (TOOL_STATUS_START/DONE).
+    return dumps_json_bytes({"type": "status", "message": message})
 
-    if not isinstance(buffer_item, dict):
-        return None
 
-    evt_type = buffer_item.get("type")
+def encode_event(buffer_item: Any) -> bytes:
+    """Typed stream event as UTF-8 JSON bytes, ready to be framed for SSE."""
+    if (
+        isinstance(buffer_item, dict)
+        and len(buffer_item) == 2
+        and buffer_item.get("type") == "status"
+        and isinstance(buffer_item.get("message"), str)
+    ):
+        return _status_bytes(buffer_item["message"])
+    return dumps_json_bytes(buffer_item)
 
-    if evt_type == "status":
-        msg = buffer_item.get("message") or ""
-        if msg:
-            return format_status_text(str(msg))
-        return None
 
-    if evt_type == "plan_updated":
-        plan = buffer_item.get("plan") or {}
-        todos = plan.get("todos") if isinstance(plan, dict) else []
-        if isinstance(todos, list) and todos:
-            labels = []
-            for t in todos[:8]:
-                if isinstance(t, dict) and t.get("title"):
-                    status = t.get("status", "pending")
-                    labels.append(f"{t.get('title')} ({status})")
-            if labels:
-                return format_status_text("[Plan] " + " → ".join(labels))
-        summary = plan.get("summary") if isinstance(plan, dict) else ""
-        if summary:
-            return format_status_text(f"[Plan] {summary}")
-        return None
+def _legacy_text_delta(item: Dict[str, Any]) -> Optional[str]:
+    content = item.get("content") or ""
+    return content if content else None
 
-    if evt_type == "plan_todos":
-        todos = buffer_item.get("todos") or []
-        if isinstance(todos, list) and todos:
-            labels = []
-            for t in todos[:8]:
-                if isinstance(t, dict) and t.get("label"):
-                    labels.append(str(t.get("label")))
-            if labels:
-                return format_status_text("[Plan] " + " → ".join(labels))
-        return None
 
-    if evt_type == "todo_update":
-        tid = buffer_item.get("id") or ""
-        status = buffer_item.get("status") or ""
-        label = buffer_item.get("label") or tid
-        if tid and status:
-            return format_status_text(f"[Todo] {label}: {status}")
-        return None
+def _legacy_status(item: Dict[str, Any]) -> Optional[str]:
+    msg = item.get("message") or ""
+    if msg:
+        return format_status_text(str(msg))
+    return None
 
-    if evt_type == "apply_started":
-        label = buffer_item.get("label") or "Applying edits"
-        element_ids = buffer_item.get("elementIds") or []
-        count = len(element_ids) if isinstance(element_ids, list) else 0
-        return format_status_text(f"[Applying] {label} ({count} elements)")
 
-    if evt_type == "apply_done":
-        return format_status_text("[Applying] Done")
+_PLAN_PREFIX = "[Plan] "
+_PLAN_ARROW = " → "
 
-    if evt_type == "text_delta":
-        content = buffer_item.get("content") or ""
-        return content if content else None
 
+def _legacy_plan_updated(item: Dict[str, Any]) -> Optional[str]:
+    plan = item.get("plan") or {}
+    todos = plan.get("todos") if isinstance(plan, dict) else []
+    if isinstance(todos, list) and todos:
+        labels = [
+            f"{title} ({t.get('status', 'pending')})"
+            for t in todos[:8]
+            if isinstance(t, dict) and (title := t.get("title"))
+        ]
+        if labels:
+            return format_status_text(_PLAN_PREFIX + _PLAN_ARROW.join(labels))
+    summary = plan.get("summary") if isinstance(plan, dict) else ""
+    if summary:
+        return format_status_text(_PLAN_PREFIX + str(summary))
     return None
 
 
+def _legacy_plan_todos(item: Dict[str, Any]) -> Optional[str]:
+    todos = item.get("todos") or []
+    if isinstance(todos, list) and todos:
+        labels = [
+            str(label)
+            for t in todos[:8]
+            if isinstance(t, dict) and (label := t.get("label"))
+        ]
+        if labels:
+            return format_status_text(_PLAN_PREFIX + _PLAN_ARROW.join(labels))
+    return None
+
+
+def _legacy_todo_update(item: Dict[str, Any]) -> Optional[str]:
+    tid = item.get("id") or ""
+    status = item.get("status") or ""
+    label = item.get("label") or tid
+    if tid and status:
+        return format_status_text(f"[Todo] {label}: {status}")
+    return None
+
+
+def _legacy_apply_started(item: Dict[str, Any]) -> Optional[str]:
+    label = item.get("label") or "Applying edits"
+    element_ids = item.get("elementIds") or []
+    count = len(element_ids) if isinstance(element_ids, list) else 0
+    return format_status_text(f"[Applying] {label} ({count} elements)")
+
+
+_APPLY_DONE_TEXT = format_status_text("[Applying] Done")
+
+
+def _legacy_apply_done(item: Dict[str, Any]) -> Optional[str]:
+    return _APPLY_DONE_TEXT
+
+
+# Legacy (plain text) renderers by event type; types not listed are dropped.
+_LEGACY_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "text_delta": _legacy_text_delta,
+    "status": _legacy_status,
+    "plan_updated": _legacy_plan_updated,
+    "plan_todos": _legacy_plan_todos,
+    "todo_update": _legacy_todo_update,
+    "apply_started": _legacy_apply_started,
+    "apply_done": _legacy_apply_done,
+}
+
+
+def format_buffer_item(buffer_item: Any, stream_events: bool) -> Optional[str]:
+    """Format a buffered stream item for output."""
+    if stream_events:
+        return encode_event(buffer_item).decode("utf-8")
+
+    if not isinstance(buffer_item, dict):
+        return None
+
+    handler = _LEGACY_HANDLERS.get(buffer_item.get("type"))
+    return handler(buffer_item) if handler else None
+
+
+def encode_final_payload(
+    *,
+    applied_edits: Optional[Dict[str, Any]] = None,
+    beat_ops: Optional[List[Dict[str, Any]]] = None,
+    content: Optional[str] = None,
+) -> bytes:
+    """Typed final event as UTF-8 JSON bytes.
+
+    The envelope is fixed, so it is written as literal fragments and only the
+    values are encoded.
+    """
+    buf = bytearray(b'{"type":"final"')
+    if applied_edits:
+        buf += b',"edits":'
+        buf += dumps_json_bytes(applied_edits)
+    if beat_ops:
+        buf += b',"beatOps":{"ops":'
+        buf += dumps_json_bytes(beat_ops)
+        buf += b"}"
+    if content:
+        buf += b',"content":'
+        buf += dumps_json_bytes(content)
+    buf += b"}"
+    return bytes(buf)
+
+
 def format_final_payload(
     stream_events: bool,
     *,
@@ -89,14 +192,9 @@ def format_final_payload(
 ) -> str:
     """Format final payload for chat output (edits, beat ops, and/or text)."""
     if stream_events:
-        payload: Dict[str, Any] = {"type": "final"}
-        if applied_edits:
-            payload["edits"] = applied_edits
-        if beat_ops:
-            payload["beatOps"] = {"ops": beat_ops}
-        if content:
-            payload["content"] = content
-        return json.dumps(payload)
+        return encode_final_payload(
+            applied_edits=applied_edits, beat_ops=beat_ops, content=content
+        ).decode("utf-8")
 
     legacy: Dict[str, Any] = {}
     if applied_edits:
@@ -105,11 +203,13 @@ def format_final_payload(
         legacy["ops"] = beat_ops
     if content and not legacy:
         return content
-    return json.dumps(legacy)
+    return dumps_json(legacy)
 
 
 EmitFn = Callable[[Dict[str, Any]], Awaitable[None]]
 
+NO_OUTPUT_ANSWER = "I couldn't complete the request. Please try again."
+
 TOOL_STATUS_START: Dict[str, str] = {
     "update_plan": "[Planning] Updating plan",
     "web_search": "[Searching] Searching the web",
@@ -176,7 +276,7 @@ def _extract_submit_edit_ids(item: Any) -> List[str]:
     if not args:
         return []
     try:
-        parsed = json.loads(args) if isinstance(args, str) else args
+        parsed = loads_json(args) if isinstance(args, str) else args
         edits_list = parsed.get("edits", []) if isinstance(parsed, dict) else []
         return [
             str(e.get("elementId", ""))
@@ -231,6 +331,7 @@ async def run_unified_agent_streaming(
     from agents.stream_events import AgentUpdatedStreamEvent, RawResponsesStreamEvent, RunItemStreamEvent
     from openai.types.responses.response_text_delta_event import ResponseTextDeltaEvent
 
+    started_at = datetime.now(timezone.utc)
     await emit({"type": "status", "message": "[Start] Processing request"})
 
     final_output: str = ""
@@ -340,6 +441,14 @@ async def run_unified_agent_streaming(
                 except Exception as cancel_e:
                     logger.warning(f"[streaming] agent cancel failed: {cancel_e}")
             logger.info("[streaming] agent run cancelled")
+            # Record what the run did before the client went away.
+            _log_run_to_langfuse(
+                result,
+                agent_input,
+                final_output,
+                {**(trace_metadata or {}), "cancelled": True},
+                started_at,
+            )
             raise
 
         if result is not None:
@@ -357,20 +466,7 @@ async def run_unified_agent_streaming(
         logger.exception(f"[streaming] agent run failed: {run_e}")
         raise
 
-    try:
-        from services.observability.langfuse_client import langfuse_client
-
-        run_items = getattr(result, "new_items", None) if result is not None else None
-        if run_items:
-            langfuse_client.log_agent_run(
-                input_prompt=_input_preview(agent_input),
-                output_text=final_output,
-                run_items=run_items,
-                metadata=trace_metadata,
-                tags=trace_metadata.get("tags") if trace_metadata else None,
-            )
-    except Exception as lf_err:
-        logger.warning(f"[streaming] Langfuse logging failed: {lf_err}")
+    _log_run_to_langfuse(result, agent_input, final_output, trace_metadata, started_at)
 
     await emit({
         "type": "agent_done",
@@ -379,11 +475,36 @@ async def run_unified_agent_streaming(
     })
 
     if not final_output:
-        final_output = "I couldn't complete the request. Please try again."
+        final_output = NO_OUTPUT_ANSWER
 
     return final_output
 
 
+def _log_run_to_langfuse(
+    result: Any,
+    agent_input: Union[str, List[Any]],
+    final_output: str,
+    trace_metadata: Optional[Dict[str, Any]],
+    started_at: datetime,
+) -> None:
+    run_items = getattr(result, "new_items", None) if result is not None else None
+    if not run_items or not langfuse_client.is_active:
+        return
+    try:
+        # Walking run items and serializing tool args is synchronous SDK work;
+        # it runs on the Langfuse worker so the stream (or a cancel) isn't held up.
+        langfuse_client.log_agent_run_background(
+            input_prompt=_input_preview(agent_input),
+            output_text=final_output,
+            run_items=list(run_items),
+            metadata=trace_metadata,
+            tags=trace_metadata.get("tags") if trace_metadata else None,
+            timestamp=started_at,
+        )
+    except Exception as lf_err:
+        logger.warning(f"[streaming] Langfuse logging failed: {lf_err}")
+
+
 def _input_preview(agent_input: Union[str, List[Any]]) -> str:
     if isinstance(agent_input, str):
         return agent_input
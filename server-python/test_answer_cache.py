@@ -0,0 +1,38 @@
+"""Unit tests for the ask-mode answer cache."""
+
+from services.answer_cache import AnswerCache, context_hash, normalize_prompt
+
+
+def test_normalize_prompt_folds_case_and_punctuation():
+    assert normalize_prompt("  What does STEEL want?! ") == "what does steel want"
+
+
+def test_get_matches_near_duplicate_prompt():
+    cache = AnswerCache(ttl_s=60, max_entries=8)
+    ctx = context_hash("gpt-4.1", "scene")
+    cache.put("p1", "Who is Peggy?", ctx, "A salon owner.")
+    assert cache.get("p1", "who is peggy", ctx) == "A salon owner."
+
+
+def test_get_is_namespaced_by_project_and_context():
+    cache = AnswerCache(ttl_s=60, max_entries=8)
+    ctx = context_hash("gpt-4.1", "scene")
+    cache.put("p1", "Who is Peggy?", ctx, "A salon owner.")
+    assert cache.get("p2", "Who is Peggy?", ctx) is None
+    assert cache.get("p1", "Who is Peggy?", context_hash("gpt-4.1", "other")) is None
+
+
+def test_entries_expire_and_are_lru_bounded():
+    now = [1000.0]
+    expired = AnswerCache(ttl_s=60, max_entries=8, clock=lambda: now[0])
+    expired.put("p1", "question", "ctx", "answer")
+    now[0] += 60
+    assert expired.get("p1", "question", "ctx") == "answer"
+    now[0] += 1
+    assert expired.get("p1", "question", "ctx") is None
+
+    cache = AnswerCache(ttl_s=60, max_entries=2)
+    for i in range(3):
+        cache.put("p1", f"question {i}", "ctx", f"answer {i}")
+    assert cache.get("p1", "question 0", "ctx") is None
+    assert cache.get("p1", "question 2", "ctx") == "answer 2"
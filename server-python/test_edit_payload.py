@@ -0,0 +1,33 @@
+"""Unit tests for pulling the edits JSON out of free-form model output."""
+
+import pytest
+
+pytest.importorskip("agents")
+
+from services.llm_service import _parse_edits_payload  # noqa: E402
+
+EDITS = '{"edits": [{"elementId": "e1", "originalContent": "Hi.", "newContent": "Hello."}]}'
+
+
+def test_finds_json_after_prose_mentioning_edits():
+    text = f'Here are the "edits" you asked for:\n```json\n{EDITS}\n```\nLet me know.'
+    assert _parse_edits_payload(text) == {
+        "edits": [{"elementId": "e1", "originalContent": "Hi.", "newContent": "Hello."}]
+    }
+
+
+def test_braces_inside_strings_do_not_confuse_decoding():
+    text = 'Sure.\n{"edits": [{"elementId": "e1", "newContent": "She draws a } and a {\\"edits\\": x"}]}'
+    assert _parse_edits_payload(text) == {
+        "edits": [{"elementId": "e1", "newContent": 'She draws a } and a {"edits": x'}]
+    }
+
+
+def test_nested_edits_object_is_found():
+    text = '{"result": {"edits": [{"elementId": "e1", "newContent": "Hello."}]}}'
+    assert _parse_edits_payload(text) == {"edits": [{"elementId": "e1", "newContent": "Hello."}]}
+
+
+def test_returns_none_without_an_edits_object():
+    assert _parse_edits_payload('No "edits" needed here.') is None
+    assert _parse_edits_payload("Plain answer.") is None
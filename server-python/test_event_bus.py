@@ -0,0 +1,156 @@
+"""Unit tests for sharing one agent run across identical chat requests."""
+
+import asyncio
+
+import pytest
+
+from services.edit_types import ScreenplayDeps
+from services.event_bus import AgentEventBus
+
+
+def _status(message):
+    return {"type": "status", "message": message}
+
+
+async def _collect(bus, wake):
+    seen = []
+    async for batch in bus.drain(wake):
+        seen.extend(evt["message"] for evt, _ in batch)
+    return seen
+
+
+def test_late_subscriber_gets_history_replayed_then_live_events():
+    async def scenario():
+        bus = AgentEventBus(deps=ScreenplayDeps())
+        early = bus.subscribe()
+        await bus.publish(_status("one"))
+        late = bus.subscribe()
+        readers = [asyncio.create_task(_collect(bus, w)) for w in (early, late)]
+        await asyncio.sleep(0)
+        await bus.publish(_status("two"))
+        bus.close()
+        return await asyncio.gather(*readers)
+
+    early_seen, late_seen = asyncio.run(scenario())
+    assert early_seen == late_seen == ["one", "two"]
+
+
+def test_events_are_encoded_once_per_publish():
+    async def scenario():
+        bus = AgentEventBus(deps=ScreenplayDeps())
+        await bus.publish(_status("one"))
+        return bus
+
+    bus = asyncio.run(scenario())
+    (_, wire), = bus.events
+    assert wire.startswith(b"{") and b"\n" not in wire
+
+
+def test_last_subscriber_leaving_cancels_run_and_blocks_joins():
+    async def scenario():
+        bus = AgentEventBus(deps=ScreenplayDeps())
+        bus.task = asyncio.create_task(asyncio.sleep(60))
+        first, second = bus.subscribe(), bus.subscribe()
+        assert bus.joinable
+        assert bus.unsubscribe(first) is False
+        assert bus.joinable and not bus.task.cancelling()
+        assert bus.unsubscribe(second) is True
+        # Cancellation is pending but the task has not finished yet.
+        assert not bus.task.done() and not bus.joinable
+        assert bus.unsubscribe(second) is False
+        with pytest.raises(asyncio.CancelledError):
+            await bus.task
+
+    asyncio.run(scenario())
+
+
+def test_remaining_subscriber_finishes_after_another_leaves():
+    async def scenario():
+        bus = AgentEventBus(deps=ScreenplayDeps())
+        release = asyncio.Event()
+
+        async def run():
+            await bus.publish(_status("one"))
+            await release.wait()
+            await bus.publish(_status("two"))
+            return "answer"
+
+        leaving, staying = bus.subscribe(), bus.subscribe()
+        bus.task = asyncio.create_task(run())
+        bus.task.add_done_callback(lambda _t: bus.close())
+        reader = asyncio.create_task(_collect(bus, staying))
+        await asyncio.sleep(0)
+        assert bus.unsubscribe(leaving) is False
+        release.set()
+        return await reader, await bus.task
+
+    seen, answer = asyncio.run(scenario())
+    assert seen == ["one", "two"]
+    assert answer == "answer"
+
+
+def test_retry_after_cancelled_run_starts_a_fresh_run(monkeypatch):
+    pytest.importorskip("agents")
+    from services import llm_service as llm_module
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    runs = []
+
+    async def fake_run(agent, agent_input, *, context, emit, **_kwargs):
+        runs.append(agent_input)
+        await emit(_status("Working"))
+        if len(runs) == 1:
+            await asyncio.sleep(60)
+        return "done"
+
+    monkeypatch.setattr(llm_module, "run_unified_agent_streaming", fake_run)
+    monkeypatch.setattr(llm_module.LLMService, "_ensure_unified_agent", lambda self, model: None)
+
+    async def scenario():
+        service = llm_module.LLMService()
+        messages = [{"role": "user", "content": "Tighten this scene"}]
+        first = service.stream_chat(messages, mode="edit")
+        assert await first.__anext__()
+        pending = asyncio.create_task(first.__anext__())
+        await asyncio.sleep(0)
+        pending.cancel()
+        # Let the first request unsubscribe (cancelling its run) but retry before
+        # that run has finished unwinding.
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        chunks = [chunk async for chunk in service.stream_chat(messages, mode="edit")]
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        return chunks
+
+    chunks = asyncio.run(scenario())
+    assert len(runs) == 2
+    assert chunks[-1] == b'{"type":"final","content":"done"}'
+
+
+def test_live_request_falls_back_when_its_shared_run_is_cancelled(monkeypatch):
+    pytest.importorskip("agents")
+    from services import llm_service as llm_module
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    async def fake_run(agent, agent_input, *, context, emit, **_kwargs):
+        await emit(_status("Working"))
+        await asyncio.sleep(60)
+
+    async def fake_fallback(self, **_kwargs):
+        yield "fallback answer"
+
+    monkeypatch.setattr(llm_module, "run_unified_agent_streaming", fake_run)
+    monkeypatch.setattr(llm_module.LLMService, "_ensure_unified_agent", lambda self, model: None)
+    monkeypatch.setattr(llm_module.LLMService, "_stream_chat_fallback", fake_fallback)
+
+    async def scenario():
+        service = llm_module.LLMService()
+        stream = service.stream_chat([{"role": "user", "content": "Tighten this scene"}], mode="edit")
+        assert await stream.__anext__()
+        (shared,) = service._inflight.values()
+        shared.task.cancel()
+        return [chunk async for chunk in stream]
+
+    assert asyncio.run(scenario()) == ["fallback answer"]
@@ -49,3 +49,55 @@ def test_make_snippet_centers_on_match():
     snippet = make_snippet(content, ["PEGGY"], max_len=40)
     assert "PEGGY" in snippet
     assert snippet.startswith("…") or snippet.endswith("…") or "…" in snippet
+
+
+def test_search_scene_context_returns_line_windows():
+    from services.search_helpers import search_scene_context
+
+    context = "\n".join(["[ACTION] Rain.", "[CHARACTER] PEGGY", "[DIALOGUE] Hello.", "[ACTION] Door."])
+    excerpts = search_scene_context(context, ["peggy"], window=1)
+    assert excerpts == ["[ACTION] Rain.\n[CHARACTER] PEGGY\n[DIALOGUE] Hello."]
+
+
+def test_search_scene_context_caps_matches():
+    from services.search_helpers import search_scene_context
+
+    context = "\n".join(f"PEGGY line {i}" if i % 10 == 0 else "[ACTION] ..." for i in range(300))
+    assert len(search_scene_context(context, ["Peggy"], max_matches=10)) == 10
+
+
+def test_search_scene_context_merges_overlapping_windows():
+    from services.search_helpers import search_scene_context
+
+    context = "\n".join(["[ACTION] Rain.", "[CHARACTER] PEGGY", "[CHARACTER] PEGGY", "[ACTION] Door.", "[ACTION] Dust."])
+    excerpts = search_scene_context(context, ["peggy"], window=1)
+    assert excerpts == ["[ACTION] Rain.\n[CHARACTER] PEGGY\n[CHARACTER] PEGGY\n[ACTION] Door."]
+
+
+def test_search_scene_context_applies_type_filter_and_all_mode():
+    from services.search_helpers import search_scene_context
+
+    context = "\n\n".join(
+        [
+            "Element 1 (ID: id1, Type: action):\n[ACTION] Peggy waits by the salon door.",
+            "Element 2 (ID: id2, Type: dialogue):\n[DIALOGUE] Peggy, the salon is closed.",
+            "Element 3 (ID: id3, Type: dialogue):\n[DIALOGUE] Peggy?",
+        ]
+    )
+    dialogue = search_scene_context(context, ["Peggy"], element_types=["dialogue"], window=0)
+    assert dialogue == ["[DIALOGUE] Peggy, the salon is closed.", "[DIALOGUE] Peggy?"]
+    both = search_scene_context(context, ["Peggy", "salon"], match_mode="all", element_types=["dialogue"], window=0)
+    assert both == ["[DIALOGUE] Peggy, the salon is closed."]
+
+
+def test_extract_scene_context_elements_merges_windows():
+    from services.search_helpers import extract_scene_context_elements
+
+    context = "\n\n".join(
+        f"Element {i} (ID: id{i}, Type: action):\n[ACTION] Line {i}." for i in range(1, 8)
+    )
+    excerpts, found = extract_scene_context_elements(context, ["id3", "id4", "missing"], context_size=1)
+    assert found == ["id3", "id4"]
+    assert len(excerpts) == 1
+    assert excerpts[0].startswith("Element 2 (ID: id2")
+    assert excerpts[0].endswith("[ACTION] Line 5.")
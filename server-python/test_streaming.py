@@ -0,0 +1,40 @@
+"""Unit tests for stream payload formatting."""
+
+import json
+
+from services.streaming import encode_final_payload, format_buffer_item, format_final_payload
+
+
+def test_format_final_payload_typed_envelope_is_valid_json():
+    edits = {"edits": [{"elementId": "e1", "newContent": 'He says "hi"\n'}]}
+    ops = [{"op": "delete", "id": "b1"}]
+    payload = json.loads(
+        format_final_payload(True, applied_edits=edits, beat_ops=ops, content="done")
+    )
+    assert payload == {
+        "type": "final",
+        "edits": edits,
+        "beatOps": {"ops": ops},
+        "content": "done",
+    }
+    assert json.loads(format_final_payload(True)) == {"type": "final"}
+
+
+def test_encode_final_payload_is_utf8_without_raw_newlines():
+    raw = encode_final_payload(content="Scène 1\nINT. HOUSE")
+    assert b"\n" not in raw
+    assert json.loads(raw.decode("utf-8")) == {"type": "final", "content": "Scène 1\nINT. HOUSE"}
+
+
+def test_format_final_payload_legacy_text_and_edits():
+    assert format_final_payload(False, content="plain answer") == "plain answer"
+    assert json.loads(format_final_payload(False, beat_ops=[{"op": "create"}])) == {
+        "ops": [{"op": "create"}]
+    }
+
+
+def test_format_buffer_item_status_round_trips():
+    evt = {"type": "status", "message": "[Searching] Querying screenplay"}
+    assert json.loads(format_buffer_item(evt, True)) == evt
+    assert format_buffer_item(evt, False) == "[Searching] Querying screenplay\n"
+    assert format_buffer_item({"type": "agent_done"}, False) is None